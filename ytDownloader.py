@@ -1,6 +1,12 @@
 import os
 import re
-import gc
+import sys
+import time
+import ctypes
+import ctypes.util
+import shutil
+import bisect
+import itertools
 import yt_dlp
 import threading
 import platform
@@ -12,8 +18,304 @@ from tkinter import ttk
 from tkinter import filedialog, messagebox, scrolledtext
 from pathlib import Path
 from functools import partial
+from enum import Enum
 import tkinter.font as tkfont
 
+class Quality(Enum):
+    """Download quality choices, shared by every task and history record"""
+    P360 = "360p"
+    P480 = "480p"
+    P720 = "720p"
+    P1080 = "1080p"
+    P1440 = "1440"
+    P2160 = "2160"
+    BEST = "best"
+    AUDIO = "audio"
+    UNKNOWN = "Unknown"
+    
+    @classmethod
+    def parse(cls, value, default=None):
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN if default is None else default
+    
+    @classmethod
+    def lookup(cls, text):
+        """Match a typed quality such as 720, 1080p, 2K or audio, or return None"""
+        labels = {'2k': '1440', '4k': '2160'}
+        text = labels.get(text.lower(), text.lower()).rstrip('p')
+        for quality in cls:
+            if quality is not cls.UNKNOWN and quality.value.lower().rstrip('p') == text:
+                return quality
+        return None
+
+class Status(Enum):
+    QUEUED = "Queued"
+    WAITING = "Waiting for space"
+    DOWNLOADING = "Downloading"
+    PROCESSING = "Processing"
+    COMPLETED = "Completed"
+    FAILED = "Failed"
+
+class HistoryRecord:
+    """One finished download, timestamped in epoch seconds"""
+    __slots__ = ('title', 'url', 'quality', 'status', 'timestamp')
+    
+    def __init__(self, title, url, quality, status, timestamp=None):
+        self.title = title
+        self.url = url
+        self.quality = quality
+        self.status = status
+        self.timestamp = time.time() if timestamp is None else timestamp
+    
+    @property
+    def success(self):
+        return self.status is Status.COMPLETED
+    
+    def formatted_time(self):
+        return datetime.datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    
+    @classmethod
+    def from_dict(cls, data):
+        timestamp = data.get('timestamp')
+        if isinstance(timestamp, str):
+            # Older history files stored formatted local times
+            try:
+                timestamp = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+            except ValueError:
+                timestamp = 0.0
+        return cls(
+            data.get('title', 'Unknown'),
+            data.get('url', ''),
+            Quality.parse(data.get('quality')),
+            Status.COMPLETED if data.get('success', False) else Status.FAILED,
+            float(timestamp or 0.0),
+        )
+    
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'quality': self.quality.value,
+            'timestamp': self.timestamp,
+            'url': self.url,
+            'success': self.success,
+        }
+
+class DownloadTask:
+    """A queued or running download and its live progress"""
+    __slots__ = ('task_id', 'url', 'quality', 'download_folder', 'estimated_size', 'status',
+                 'title', 'progress', 'speed', 'eta', 'paused', 'cancelled')
+    
+    def __init__(self, task_id, url, quality, download_folder, estimated_size=0):
+        self.task_id = task_id
+        self.url = url
+        self.quality = quality
+        # Every task in a session usually shares one folder
+        self.download_folder = sys.intern(download_folder)
+        self.estimated_size = estimated_size
+        self.status = Status.QUEUED
+        self.title = None
+        self.progress = 0.0
+        self.speed = 0.0
+        self.eta = None
+        # Set only from the Tk thread; the worker writes status, never these
+        self.paused = False
+        self.cancelled = False
+
+class VideoInfo:
+    """The parts of a yt-dlp info dict the preview needs"""
+    __slots__ = ('title', 'duration', 'heights')
+    
+    def __init__(self, title, duration, heights):
+        self.title = title
+        self.duration = duration
+        self.heights = heights
+    
+    @classmethod
+    def from_info_dict(cls, info):
+        heights = frozenset(f['height'] for f in info.get('formats') or [] if f.get('height'))
+        return cls(info.get('title', 'Unknown'), info.get('duration', 0), heights)
+
+class HistoryIndex:
+    """Inverted token index over the download history, maintained incrementally"""
+    
+    # URL parts shared by every entry, not worth a posting list
+    url_stopwords = {'http', 'https', 'www', 'm', 'youtube', 'com', 'youtu', 'be', 'watch', 'v', 'shorts'}
+    
+    def __init__(self):
+        self.entries = {}      # entry id -> history item, oldest first
+        self.postings = {}     # token -> ids of entries containing it
+        self.vocabulary = []   # tokens for prefix matching, sorted lazily
+        self.vocabulary_sorted = True
+        self.stale_tokens = 0  # removed tokens still listed in the vocabulary
+        self.timeline = []     # sorted (timestamp, entry id) pairs for date ranges
+        self.by_quality = {}   # quality -> ids
+        self.failed = set()
+        self.succeeded = set()
+        self.next_id = 0
+    
+    def tokenize(self, text):
+        return re.findall(r'\w+', str(text).lower())
+    
+    def item_tokens(self, item):
+        url_tokens = set(self.tokenize(item.url)) - self.url_stopwords
+        return set(self.tokenize(item.title)) | url_tokens
+    
+    def sorted_vocabulary(self):
+        if self.stale_tokens > len(self.postings):
+            self.vocabulary = list(self.postings)
+            self.stale_tokens = 0
+            self.vocabulary_sorted = False
+        if not self.vocabulary_sorted:
+            self.vocabulary.sort()
+            self.vocabulary_sorted = True
+        return self.vocabulary
+    
+    def add(self, item):
+        """Index a new (newest) history item and return its entry id"""
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = item
+        
+        for token in self.item_tokens(item):
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                self.vocabulary.append(token)
+                self.vocabulary_sorted = False
+            ids.add(entry_id)
+        
+        key = (item.timestamp, entry_id)
+        if not self.timeline or key >= self.timeline[-1]:
+            self.timeline.append(key)
+        else:
+            bisect.insort(self.timeline, key)
+        
+        self.by_quality.setdefault(item.quality, set()).add(entry_id)
+        if item.success:
+            self.succeeded.add(entry_id)
+        else:
+            self.failed.add(entry_id)
+        return entry_id
+    
+    def remove(self, entry_id):
+        item = self.entries.pop(entry_id, None)
+        if item is None:
+            return
+        
+        for token in self.item_tokens(item):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(entry_id)
+            if not ids:
+                # Dropped from the vocabulary on the next rebuild
+                del self.postings[token]
+                self.stale_tokens += 1
+        
+        key = (item.timestamp, entry_id)
+        position = bisect.bisect_left(self.timeline, key)
+        if position < len(self.timeline) and self.timeline[position] == key:
+            del self.timeline[position]
+        
+        quality_ids = self.by_quality.get(item.quality)
+        if quality_ids is not None:
+            quality_ids.discard(entry_id)
+        self.failed.discard(entry_id)
+        self.succeeded.discard(entry_id)
+    
+    def remove_oldest(self, count):
+        for entry_id in list(itertools.islice(self.entries, count)):
+            self.remove(entry_id)
+    
+    def clear(self):
+        self.__init__()
+    
+    def prefix_ids(self, prefix):
+        """Union of the postings of every token starting with prefix"""
+        vocabulary = self.sorted_vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\uffff', start)
+        matches = [self.postings[token] for token in vocabulary[start:end] if token in self.postings]
+        if len(matches) == 1:
+            return matches[0]
+        return set().union(*matches)
+    
+    def range_ids(self, start, end):
+        """Ids of entries downloaded between the start and end datetimes"""
+        low = (start.timestamp(), -1) if start else None
+        high = (end.timestamp(), self.next_id) if end else None
+        first = bisect.bisect_left(self.timeline, low) if low else 0
+        last = bisect.bisect_right(self.timeline, high) if high else len(self.timeline)
+        return {entry_id for _, entry_id in self.timeline[first:last]}
+    
+    def query(self, text="", quality=None, failed=None, start=None, end=None, offset=0, limit=20):
+        """Return (total, items) for one page of matches, newest first.
+        
+        Every word in text must match a title or URL token; the last word
+        may be a prefix so results update while typing. start and end are
+        datetimes bounding the download timestamp.
+        """
+        candidates = []
+        words = self.tokenize(text)
+        for word in words[:-1]:
+            candidates.append(self.postings.get(word, set()))
+        if words:
+            candidates.append(self.prefix_ids(words[-1]))
+        if quality is not None:
+            candidates.append(self.by_quality.get(quality, set()))
+        if failed is not None:
+            candidates.append(self.failed if failed else self.succeeded)
+        if start is not None or end is not None:
+            candidates.append(self.range_ids(start, end))
+        
+        if not candidates:
+            page = [entry_id for _, entry_id in zip(range(offset + limit), reversed(self.entries))][offset:]
+            return len(self.entries), [self.entries[i] for i in page]
+        
+        # Intersect starting from the smallest set
+        candidates.sort(key=len)
+        ids = candidates[0].intersection(*candidates[1:]) if len(candidates) > 1 else candidates[0]
+        wanted = offset + limit
+        if ids and wanted * len(self.entries) < len(ids) ** 2:
+            # Dense match: walking back from the newest entry finds the page quickly
+            newest = (entry_id for entry_id in reversed(self.entries) if entry_id in ids)
+            page = list(itertools.islice(newest, offset, wanted))
+        else:
+            page = sorted(ids, reverse=True)[offset:wanted]
+        return len(ids), [self.entries[i] for i in page]
+    
+    def search(self, query, offset=0, limit=20):
+        """Run a search box query such as: lofi quality:720p failed after:2024-01-01"""
+        words = []
+        filters = {}
+        for part in query.split():
+            key, _, value = part.partition(':')
+            key = key.lower()
+            try:
+                if part.lower() == 'failed':
+                    filters['failed'] = True
+                elif key == 'quality' and value:
+                    filters['quality'] = Quality.lookup(value)
+                    if filters['quality'] is None:
+                        # Nothing was downloaded at a quality we don't know
+                        return 0, []
+                elif key == 'after' and value:
+                    filters['start'] = datetime.datetime.strptime(value, "%Y-%m-%d")
+                elif key == 'before' and value:
+                    filters['end'] = datetime.datetime.strptime(value, "%Y-%m-%d").replace(
+                        hour=23, minute=59, second=59)
+                elif key == 'status' and value.lower() == 'failed':
+                    filters['failed'] = True
+                elif key == 'status' and value.lower() in ('ok', 'success'):
+                    filters['failed'] = False
+                else:
+                    words.append(part)
+            except ValueError:
+                words.append(part)
+        return self.query(" ".join(words), offset=offset, limit=limit, **filters)
+
 class YouTubeDownloaderApp:
     def __init__(self, root):
         self.root = root
@@ -23,18 +325,41 @@ class YouTubeDownloaderApp:
         
         # Variables
         self.selected_quality = "720p"
-        self.download_thread = None
-        self.stop_download = False
         self.download_history = []
         self.download_queue = []
-        self.is_downloading = False
+        self.active_tasks = {}  # task id -> running DownloadTask
+        self.max_concurrent_downloads = 2
+        self.task_ids = itertools.count(1)
+        self.queue_retry_job = None
+        
+        # Workers only mark tasks dirty; the queue view redraws them once per tick
+        self.dirty_tasks = set()
+        self.dirty_tasks_lock = threading.Lock()
+        self.queue_refresh_ms = 250
         self.current_video_info = None
-        self.max_history_items = 50
+        self.max_history_items = 100000
+        self.history_index = HistoryIndex()
+        self.history_loaded = False
+        self.pending_history = []  # downloads finished while the history was loading
         self.history_visible = False
         self.history_frame = None
+        self.history_items_frame = None
+        self.history_page = 0
+        self.history_page_size = 20
+        self.history_search_job = None
+        
+        # Disk space admission control
+        self.min_free_space = 200 * 1024 * 1024  # Always leave this much free
+        self.disk_space_retry_ms = 5000
+        self.disk_reservations = {}
+        self.next_reservation_id = 0
+        self.disk_reservation_lock = threading.RLock()
+        self.preallocated_files = set()
+        self.fallocate = self.load_fallocate()
         
         # Theme variables
         self.is_dark_mode = False
+        self.themed_widgets = {}  # widget path -> (widget, {option: color key})
         
         # Define colors for themes
         self.theme_colors = {
@@ -65,7 +390,9 @@ class YouTubeDownloaderApp:
         self.main_frame.pack(fill=tk.BOTH, expand=True)
         
         # Canvas for scrolling
-        self.canvas = tk.Canvas(self.main_frame, bg=self.theme_colors["light"]["bg"])
+        self.canvas = tk.Canvas(self.main_frame)
+        self.register_themed_widget(self.root, bg="bg")
+        self.register_themed_widget(self.canvas, bg="bg")
         self.scrollbar = ttk.Scrollbar(self.main_frame, orient=tk.VERTICAL, command=self.canvas.yview)
         self.canvas.configure(yscrollcommand=self.scrollbar.set)
         
@@ -85,6 +412,7 @@ class YouTubeDownloaderApp:
         self.create_url_input_card()
         self.create_progress_card()  # Move this up before create_quality_selection_card
         self.create_quality_selection_card()
+        self.create_queue_card()
         
         # Configure mouse wheel scrolling
         self.root.bind("<MouseWheel>", self.on_mousewheel)
@@ -92,8 +420,12 @@ class YouTubeDownloaderApp:
         self.root.bind("<Button-4>", self.on_mousewheel)
         self.root.bind("<Button-5>", self.on_mousewheel)
         
-        # Load saved history
-        self.load_history()
+        # Load saved history in the background once the window is up; the
+        # loader reports back through root.after, which needs a running mainloop
+        self.root.after(0, lambda: threading.Thread(target=self.load_history, daemon=True).start())
+        
+        # Start the batched queue redraw
+        self.refresh_queue_view()
     
     def configure_styles(self):
         """Configure the styles based on current theme"""
@@ -125,6 +457,11 @@ class YouTubeDownloaderApp:
         
         # Configure the listbox style (will be created dynamically)
         self.style.configure('History.TFrame', background=card_bg)
+        
+        # Queue panel
+        self.style.configure('Treeview', font=('Arial', 9), background=card_bg,
+                             fieldbackground=card_bg, foreground=text_color)
+        self.style.configure('Treeview.Heading', font=('Arial', 9, 'bold'))
     
     def on_mousewheel(self, event):
         if event.num == 4:  # Linux scroll up
@@ -142,64 +479,32 @@ class YouTubeDownloaderApp:
     
     def toggle_theme(self):
         self.is_dark_mode = not self.is_dark_mode
-        theme = "dark" if self.is_dark_mode else "light"
-        colors = self.theme_colors[theme]
         
-        # Update canvas and root background
-        self.canvas.configure(bg=colors["bg"])
-        self.root.configure(bg=colors["bg"])
-        
-        # Reconfigure all styles
+        # ttk widgets pick up the new style definitions in a single Tk pass
         self.configure_styles()
         
-        # Update all existing widgets
-        self.update_widget_styles(self.content_frame)
-        
-        # Update history frame if visible
-        if self.history_visible and self.history_frame:
-            self.update_widget_styles(self.history_frame)
+        # Only the registered non-ttk widgets need their colors set directly
+        for widget, options in self.themed_widgets.values():
+            self.apply_widget_colors(widget, options)
     
-    def update_widget_styles(self, parent):
-        """Recursively update all widget styles"""
-        for widget in parent.winfo_children():
-            widget_type = widget.winfo_class()
-            
-            if widget_type == "TFrame":
-                if "card" in str(widget).lower():
-                    widget.configure(style="Card.TFrame")
-                else:
-                    widget.configure(style="TFrame")
-            elif widget_type == "TLabel":
-                if "header" in str(widget).lower():
-                    widget.configure(style="Header.TLabel")
-                elif "subheader" in str(widget).lower():
-                    widget.configure(style="Subheader.TLabel")
-                else:
-                    widget.configure(style="TLabel")
-            elif widget_type == "TButton":
-                # Preserve special button styles
-                if "download" in str(widget).lower():
-                    widget.configure(style="GreenButton.TButton")
-                elif "cancel" in str(widget).lower():
-                    widget.configure(style="RedButton.TButton")
-                elif "history" in str(widget).lower():
-                    widget.configure(style="BlueButton.TButton")
-                elif any(quality in str(widget).lower() for quality in ["360p", "480p", "720p", "1080p", "2k", "4k", "best", "audio"]):
-                    widget.configure(style="QualityButton.TButton")
-                else:
-                    widget.configure(style="TButton")
-            elif widget_type == "TProgressbar":
-                widget.configure(style="Horizontal.TProgressbar")
-            elif widget_type == "TEntry":
-                widget.configure(style="TEntry")
-            elif widget_type == "Listbox":
-                theme = "dark" if self.is_dark_mode else "light"
-                colors = self.theme_colors[theme]
-                widget.configure(bg=colors["card_bg"], fg=colors["text"])
-            
-            # Recursively update child widgets
-            if hasattr(widget, 'winfo_children'):
-                self.update_widget_styles(widget)
+    def register_themed_widget(self, widget, **options):
+        """Track a non-ttk widget whose options follow the theme colors.
+        
+        options map widget options to theme color keys, e.g. bg="card_bg".
+        """
+        key = str(widget)
+        self.themed_widgets[key] = (widget, options)
+        self.apply_widget_colors(widget, options)
+        widget.bind("<Destroy>", lambda e: self.unregister_themed_widget(e, key), add="+")
+    
+    def unregister_themed_widget(self, event, key):
+        # Destroy events from child widgets also reach toplevel bindings
+        if str(event.widget) == key:
+            self.themed_widgets.pop(key, None)
+    
+    def apply_widget_colors(self, widget, options):
+        colors = self.theme_colors["dark" if self.is_dark_mode else "light"]
+        widget.configure(**{option: colors[color] for option, color in options.items()})
     
     def create_header_card(self):
         header_card = ttk.Frame(self.content_frame, style='Card.TFrame', padding=15)
@@ -333,6 +638,43 @@ class YouTubeDownloaderApp:
                                         command=self.toggle_history, style='BlueButton.TButton')
         self.history_button.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
     
+    def create_queue_card(self):
+        queue_card = ttk.Frame(self.content_frame, style='Card.TFrame', padding=15)
+        queue_card.pack(fill=tk.X, pady=10)
+        
+        queue_label = ttk.Label(queue_card, text="Download Queue",
+                               font=('Arial', 12, 'bold'), style='TLabel')
+        queue_label.pack(anchor='w', pady=(0, 10))
+        
+        # One row per pending or active job
+        tree_frame = ttk.Frame(queue_card, style='Card.TFrame')
+        tree_frame.pack(fill=tk.X)
+        
+        columns = ("title", "state", "progress", "rate", "eta")
+        self.queue_tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
+                                      height=6, selectmode='extended')
+        for column, heading, width in [("title", "Title", 180), ("state", "State", 90),
+                                       ("progress", "Progress", 60), ("rate", "Rate", 70),
+                                       ("eta", "ETA", 50)]:
+            self.queue_tree.heading(column, text=heading)
+            self.queue_tree.column(column, width=width, stretch=(column == "title"))
+        
+        queue_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.queue_tree.yview)
+        self.queue_tree.configure(yscrollcommand=queue_scrollbar.set)
+        queue_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.queue_tree.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Per-job controls act on the selected rows
+        controls_frame = ttk.Frame(queue_card, style='Card.TFrame')
+        controls_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        for text, command in [("▲ Up", lambda: self.move_selected_tasks(-1)),
+                              ("▼ Down", lambda: self.move_selected_tasks(1)),
+                              ("Pause/Resume", self.toggle_pause_selected_tasks),
+                              ("Cancel", self.cancel_selected_tasks)]:
+            button = ttk.Button(controls_frame, text=text, command=command)
+            button.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+    
     def create_history_card(self):
         if self.history_frame:
             self.history_frame.destroy()
@@ -352,14 +694,25 @@ class YouTubeDownloaderApp:
                                  command=self.clear_history, width=8)
         clear_button.pack(side=tk.RIGHT, padx=5)
         
+        # Search box
+        search_frame = ttk.Frame(self.history_frame, style='Card.TFrame')
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        self.history_search_input = ttk.Entry(search_frame)
+        self.history_search_input.pack(fill=tk.X, ipady=4)
+        self.history_search_input.bind("<KeyRelease>", self.schedule_history_search)
+        
+        search_hint = ttk.Label(search_frame, text="Filters: quality:720p  failed  after:YYYY-MM-DD  before:YYYY-MM-DD",
+                               style='TLabel', font=('Arial', 8), foreground='gray')
+        search_hint.pack(anchor='w')
+        
         # Create a scrollable area for history items
         history_container = ttk.Frame(self.history_frame, style='History.TFrame')
         history_container.pack(fill=tk.BOTH, expand=True, pady=5)
         
         # Create a canvas with scrollbar for the history items
-        history_canvas = tk.Canvas(history_container, 
-                                  bg=self.theme_colors["dark" if self.is_dark_mode else "light"]["card_bg"],
-                                  highlightthickness=0)
+        history_canvas = tk.Canvas(history_container, highlightthickness=0)
+        self.register_themed_widget(history_canvas, bg="card_bg")
         history_scrollbar = ttk.Scrollbar(history_container, orient=tk.VERTICAL, 
                                          command=history_canvas.yview)
         
@@ -368,25 +721,89 @@ class YouTubeDownloaderApp:
         history_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         # Frame for history items
-        items_frame = ttk.Frame(history_canvas, style='History.TFrame')
-        history_canvas.create_window((0, 0), window=items_frame, anchor="nw")
+        self.history_items_frame = ttk.Frame(history_canvas, style='History.TFrame')
+        history_canvas.create_window((0, 0), window=self.history_items_frame, anchor="nw")
+        
+        # Pagination
+        pager_frame = ttk.Frame(self.history_frame, style='Card.TFrame')
+        pager_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        self.history_prev_button = ttk.Button(pager_frame, text="< Prev", width=8,
+                                             command=lambda: self.change_history_page(-1))
+        self.history_prev_button.pack(side=tk.LEFT)
+        
+        self.history_next_button = ttk.Button(pager_frame, text="Next >", width=8,
+                                             command=lambda: self.change_history_page(1))
+        self.history_next_button.pack(side=tk.RIGHT)
+        
+        self.history_page_label = ttk.Label(pager_frame, text="", style='TLabel')
+        self.history_page_label.pack(expand=True)
         
         # Add history items
-        if not self.download_history:
-            no_history_label = ttk.Label(items_frame, text="No download history yet", 
-                                        style='TLabel', padding=10)
-            no_history_label.pack(fill=tk.X)
-        else:
-            for i, item in enumerate(self.download_history):
-                self.create_history_item(items_frame, item, i)
+        self.history_page = 0
+        self.render_history_page()
         
         # Configure canvas
-        items_frame.bind("<Configure>", 
+        self.history_items_frame.bind("<Configure>", 
                        lambda e: history_canvas.configure(scrollregion=history_canvas.bbox("all")))
         history_canvas.bind("<Configure>", 
                           lambda e: history_canvas.itemconfig(history_canvas.find_withtag("all")[0], 
                                                            width=e.width))
     
+    def render_history_page(self):
+        """Show the current page of history items matching the search box"""
+        for widget in self.history_items_frame.winfo_children():
+            widget.destroy()
+        
+        if not self.history_loaded:
+            loading_label = ttk.Label(self.history_items_frame, text="Loading history...",
+                                     style='TLabel', padding=10)
+            loading_label.pack(fill=tk.X)
+            self.history_page_label.configure(text="")
+            self.history_prev_button.state(['disabled'])
+            self.history_next_button.state(['disabled'])
+            return
+        
+        query = self.history_search_input.get().strip()
+        offset = self.history_page * self.history_page_size
+        total, items = self.history_index.search(query, offset, self.history_page_size)
+        
+        # Step back if the page ran past the end (e.g. after the history shrank)
+        if not items and self.history_page > 0:
+            self.history_page = max((total - 1) // self.history_page_size, 0)
+            offset = self.history_page * self.history_page_size
+            total, items = self.history_index.search(query, offset, self.history_page_size)
+        
+        if not items:
+            text = "No matching downloads" if query else "No download history yet"
+            no_history_label = ttk.Label(self.history_items_frame, text=text, 
+                                        style='TLabel', padding=10)
+            no_history_label.pack(fill=tk.X)
+        else:
+            for i, item in enumerate(items):
+                self.create_history_item(self.history_items_frame, item, i)
+        
+        pages = max((total + self.history_page_size - 1) // self.history_page_size, 1)
+        self.history_page_label.configure(text=f"Page {self.history_page + 1} of {pages} ({total} items)")
+        self.history_prev_button.state(['!disabled'] if self.history_page > 0 else ['disabled'])
+        self.history_next_button.state(['!disabled'] if self.history_page + 1 < pages else ['disabled'])
+    
+    def change_history_page(self, step):
+        self.history_page = max(self.history_page + step, 0)
+        self.render_history_page()
+    
+    def schedule_history_search(self, event=None):
+        # Wait for a pause in typing before searching
+        if self.history_search_job:
+            self.root.after_cancel(self.history_search_job)
+        self.history_search_job = self.root.after(200, self.run_history_search)
+    
+    def run_history_search(self):
+        self.history_search_job = None
+        if self.history_visible and self.history_frame:
+            self.history_page = 0
+            self.render_history_page()
+    
     def create_history_item(self, parent, item, index):
         item_frame = ttk.Frame(parent, style='History.TFrame', padding=5)
         item_frame.pack(fill=tk.X, pady=2)
@@ -397,10 +814,10 @@ class YouTubeDownloaderApp:
             separator.pack(fill=tk.X, pady=5)
         
         # Status icon
-        status = "✅" if item.get('success', False) else "❌"
+        status = "✅" if item.success else "❌"
         
         # Title with status
-        title = item.get('title', 'Unknown')
+        title = item.title
         title_text = f"{status} {title}"
         
         title_label = ttk.Label(item_frame, text=title_text, wraplength=450,
@@ -408,8 +825,8 @@ class YouTubeDownloaderApp:
         title_label.pack(anchor='w')
         
         # Details
-        quality = item.get('quality', 'Unknown')
-        timestamp = item.get('timestamp', 'Unknown')
+        quality = item.quality.value
+        timestamp = item.formatted_time()
         
         details_text = f"Quality: {quality} | {timestamp}"
         details_label = ttk.Label(item_frame, text=details_text, 
@@ -417,8 +834,8 @@ class YouTubeDownloaderApp:
         details_label.pack(anchor='w')
         
         # URL (optional)
-        if item.get('url'):
-            url = item.get('url')
+        if item.url:
+            url = item.url
             url_label = ttk.Label(item_frame, text=f"URL: {url}", 
                                 style='TLabel', font=('Arial', 8), foreground='gray')
             url_label.pack(anchor='w')
@@ -510,8 +927,10 @@ class YouTubeDownloaderApp:
                 info = ydl.extract_info(url, download=False)
                 
             if info:
-                self.current_video_info = info
-                self.root.after(0, lambda: self.update_ui_with_video_info(info))
+                # Keep only what the preview needs, not every format yt-dlp found
+                video_info = VideoInfo.from_info_dict(info)
+                self.current_video_info = video_info
+                self.root.after(0, lambda: self.update_ui_with_video_info(video_info))
             else:
                 self.root.after(0, lambda: messagebox.showerror("Error", "Could not fetch video information"))
                 
@@ -519,24 +938,18 @@ class YouTubeDownloaderApp:
             self.root.after(0, lambda: messagebox.showerror("Error", f"Error: {str(e)}"))
     
     def update_ui_with_video_info(self, info):
-        title = info.get('title', 'Unknown')
-        duration = info.get('duration', 0)
+        title = info.title
+        duration = info.duration
         duration_str = str(datetime.timedelta(seconds=duration)) if duration else "Unknown"
         
         self.progress_label.config(text=f"Video: {title}\nDuration: {duration_str}\nReady to download")
         
-        # Suggest quality based on available formats
-        available_formats = set()
-        for f in info.get('formats', []):
-            if f.get('height'):
-                available_formats.add(str(f.get('height')))
-        
         # Auto-select a reasonable quality based on available formats
-        if '720' in available_formats:
+        if 720 in info.heights:
             self.set_quality('720p')
-        elif '480' in available_formats:
+        elif 480 in info.heights:
             self.set_quality('480p')
-        elif '1080' in available_formats:
+        elif 1080 in info.heights:
             self.set_quality('1080p')
         else:
             self.set_quality('best')
@@ -572,59 +985,115 @@ class YouTubeDownloaderApp:
                 return
         
         # Create download task
-        task = {
-            'url': url,
-            'quality': self.selected_quality,
-            'download_folder': download_folder,
-        }
+        quality = Quality.parse(self.selected_quality, Quality.P720)
+        for queued in itertools.chain(self.active_tasks.values(), self.download_queue):
+            if (queued.url, queued.quality, queued.download_folder) == (url, quality, download_folder):
+                messagebox.showinfo("Already queued", "This video is already queued at this quality")
+                return
+        task = DownloadTask(next(self.task_ids), url, quality, download_folder)
         
         # Add to queue
         self.download_queue.append(task)
+        self.queue_tree.insert('', tk.END, iid=str(task.task_id), values=self.queue_row_values(task))
         
-        # Start download if not already downloading
-        if not self.is_downloading:
-            self.process_download_queue()
+        self.process_download_queue()
     
     def process_download_queue(self):
-        if not self.download_queue:
-            self.is_downloading = False
-            return
-        self.is_downloading = True
-        task = self.download_queue.pop(0)  # Remove task from queue
-    
-        # Set up download thread
-        self.stop_download = False
-        self.progress_bar['value'] = 0
-        self.progress_label.config(text="Preparing download...")
-    
-        self.download_thread = threading.Thread(
-           target=self.download_video,
-           args=(task['url'], task['quality'], task['download_folder']),
-           daemon=True
-        )
-        self.download_thread.start()
+        """Start queued jobs in order until every download slot is busy"""
+        if self.queue_retry_job is not None:
+            self.root.after_cancel(self.queue_retry_job)
+            self.queue_retry_job = None
+        
+        while len(self.active_tasks) < self.max_concurrent_downloads:
+            # Jobs for the same video and folder share yt-dlp's .part files (e.g. the
+            # audio stream), so they never run at the same time
+            running = {(t.url, t.download_folder) for t in self.active_tasks.values()}
+            task = next((t for t in self.download_queue
+                         if not t.paused and (t.url, t.download_folder) not in running), None)
+            if task is None:
+                break
+            
+            # Hold back a job that did not fit on disk until its folder has room for it,
+            # along with every job queued after it
+            if task.status is Status.WAITING and not self.has_disk_space(task.download_folder, task.estimated_size):
+                if not self.disk_space_may_free_up(task.download_folder):
+                    # Nothing running on this disk can release space, so it would wait forever
+                    self.fail_queued_task(task, "not enough free disk space")
+                    continue
+                if task.estimated_size:
+                    size_mb = task.estimated_size / (1024 * 1024)
+                    self.progress_label.config(text=f"Waiting for {size_mb:.0f} MB of free disk space...")
+                else:
+                    self.progress_label.config(text="Waiting for free disk space...")
+                self.queue_retry_job = self.root.after(self.disk_space_retry_ms, self.process_download_queue)
+                break
+            
+            self.download_queue.remove(task)
+            self.active_tasks[task.task_id] = task
+            task.status = Status.DOWNLOADING
+            self.mark_task_dirty(task)
+            
+            # Active jobs are listed above the queued ones
+            self.queue_tree.move(str(task.task_id), '', len(self.active_tasks) - 1)
+            
+            threading.Thread(target=self.download_video, args=(task,), daemon=True).start()
+    
+    def fail_queued_task(self, task, reason):
+        """Drop a job that can never start and record it as a failed download"""
+        self.download_queue.remove(task)
+        self.queue_tree.delete(str(task.task_id))
+        
+        title = task.title or 'Unknown'
+        self.add_to_history(HistoryRecord(title, task.url, task.quality, Status.FAILED))
+        self.update_history_display()
+        self.update_progress(0, f"Error: {title}: {reason}")
+    
+    def finish_task(self, task, held_back, paused=False):
+        """Take a worker's task off the active list and fill its slot"""
+        self.active_tasks.pop(task.task_id, None)
+        
+        if (held_back or paused) and not task.cancelled:
+            # Put a job that did not fit on disk, or was paused, back at the front
+            # of the queue; a paused job resumes from its .part file later
+            task.status = Status.WAITING if held_back else Status.QUEUED
+            task.speed = 0.0
+            task.eta = None
+            self.download_queue.insert(0, task)
+            self.queue_tree.move(str(task.task_id), '', len(self.active_tasks))
+            self.mark_task_dirty(task)
+        elif self.queue_tree.exists(str(task.task_id)):
+            self.queue_tree.delete(str(task.task_id))
+        
+        self.process_download_queue()
     
-    def download_video(self, url, quality, download_folder):
+    def download_video(self, task):
+        url = task.url
+        quality = task.quality
+        download_folder = task.download_folder
+        reservation = None
+        held_back = False
+        paused = False
+        succeeded = False
         try:
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True,
-                'progress_hooks': [self.progress_hook],
                 'outtmpl': os.path.join(download_folder, '%(title)s.%(ext)s')
             }
             
-            if quality == 'audio':
+            if quality is Quality.AUDIO:
                 ydl_opts['format'] = 'bestaudio'
                 ydl_opts['postprocessors'] = [{
                     'key': 'FFmpegExtractAudio',
                     'preferredcodec': 'mp3',
                     'preferredquality': '192',
                 }]
-            elif quality == 'best':
+            elif quality is Quality.BEST:
                 ydl_opts['format'] = 'bestvideo+bestaudio/best'
                 ydl_opts['merge_output_format'] = 'mp4'
-            elif quality in ['360p', '480p', '720p', '1080p'] or quality in ['1440', '2160']:
-                height = quality.replace('p', '')
+            elif quality in (Quality.P360, Quality.P480, Quality.P720, Quality.P1080,
+                             Quality.P1440, Quality.P2160):
+                height = quality.value.replace('p', '')
                 ydl_opts['format'] = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
                 ydl_opts['merge_output_format'] = 'mp4'
             else:
@@ -632,21 +1101,34 @@ class YouTubeDownloaderApp:
                 ydl_opts['merge_output_format'] = 'mp4'
         
             # Check if download should be stopped before beginning
-            if self.stop_download:
+            if task.cancelled:
                 self.root.after(0, lambda: self.update_progress(0, "Download cancelled"))
                 return
                 
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+                # Resolve the selected formats first so the job can be admitted
+                # against the free space in the download folder
+                info = ydl.extract_info(url, download=False)
+                if not info:
+                    raise Exception("Could not fetch video information")
+                task.title = info.get('title')
+                self.mark_task_dirty(task)
+                
+                estimated_size = self.estimate_download_size(info)
+                reservation = self.reserve_disk_space(download_folder, estimated_size)
+                if reservation is None:
+                    held_back = True
+                    task.estimated_size = estimated_size
+                    return
+                
+                ydl.add_progress_hook(partial(self.progress_hook, task, reservation=reservation))
+                info = ydl.process_ie_result(info, download=True)
                 if info:
-                    history_item = {
-                        'title': info.get('title', 'Unknown'),
-                        'quality': quality,
-                        'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        'url': url,
-                        'success': True,
-                    }
-                    self.add_to_history(history_item)
+                    title = info.get('title', 'Unknown')
+                    task.status = Status.COMPLETED
+                    succeeded = True
+                    history_item = HistoryRecord(title, url, quality, Status.COMPLETED)
+                    self.root.after(0, partial(self.add_to_history, history_item))
                     
                     # Update history display if visible
                     # Update history display if visible
@@ -654,95 +1136,412 @@ class YouTubeDownloaderApp:
                         self.root.after(0, lambda: self.update_history_display())
                         
                     # If the download is successful, process the next item in queue
-                    self.root.after(0, lambda: self.update_progress(100, f"Download complete: {info.get('title', 'Video')}"))
+                    self.root.after(0, lambda: self.update_progress(100, f"Download complete: {title}"))
                     
         except Exception as e:
-            history_item = {
-                'title': self.current_video_info.get('title', 'Unknown') if self.current_video_info else 'Unknown',
-                'quality': quality,
-                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'url': url,
-                'success': False,
-            }
-            self.add_to_history(history_item)
+            if task.cancelled:
+                # A user cancel is not a failed download
+                self.root.after(0, lambda: self.update_progress(0, "Download cancelled"))
+                return
+            if task.paused:
+                paused = True
+                return
+            
+            task.status = Status.FAILED
+            if task.title:
+                title = task.title
+            else:
+                title = self.current_video_info.title if self.current_video_info else 'Unknown'
+            history_item = HistoryRecord(title, url, quality, Status.FAILED)
+            self.root.after(0, partial(self.add_to_history, history_item))
             
             if self.history_visible:
                 self.root.after(0, lambda: self.update_history_display())
             
-            self.root.after(0, lambda: self.update_progress(0, f"Error: {str(e)}"))
+            # Format the message now so the callback does not keep the traceback alive
+            message = f"Error: {str(e)}"
+            self.root.after(0, lambda: self.update_progress(0, message))
         
         finally:
+            if reservation is not None:
+                self.release_disk_space(reservation, truncate=not succeeded)
+            
             # Process next download in queue
-            gc.collect()  # Force garbage collection
-            self.root.after(0, self.process_download_queue)
+            self.root.after(0, partial(self.finish_task, task, held_back, paused))
     
-    def progress_hook(self, d):
+    def progress_hook(self, task, d, reservation=None):
+        # Check if download should be stopped; a paused job is requeued by finish_task
+        if task.cancelled:
+            raise Exception("Download cancelled by user")
+        if task.paused:
+            raise Exception("Download paused by user")
+        
         if d['status'] == 'downloading':
-            p = d.get('_percent_str', '0%')
-            p = p.replace('%', '').strip()
-            try:
-                progress = float(p)
-                self.root.after(0, lambda: self.update_progress(progress, f"Downloading: {d.get('_eta_str', '')} remaining"))
-            except (ValueError, TypeError):
-                pass
+            self.consume_disk_reservation(reservation, d.get('tmpfilename'), d.get('downloaded_bytes') or 0)
+            self.preallocate_download(d, reservation)
+            
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if total:
+                task.progress = min(d.get('downloaded_bytes', 0) * 100.0 / total, 100.0)
+            task.speed = d.get('speed') or 0.0
+            task.eta = d.get('eta')
+            task.status = Status.DOWNLOADING
         
         elif d['status'] == 'finished':
-            self.root.after(0, lambda: self.update_progress(100, "Processing..."))
+            self.preallocated_files.discard(d.get('tmpfilename'))
+            task.progress = 100.0
+            task.speed = 0.0
+            task.eta = None
+            task.status = Status.PROCESSING
         
-        # Check if download should be stopped
-        if self.stop_download:
-            raise Exception("Download cancelled by user")
+        self.mark_task_dirty(task)
+    
+    def mark_task_dirty(self, task):
+        with self.dirty_tasks_lock:
+            self.dirty_tasks.add(task)
+    
+    def refresh_queue_view(self):
+        """Redraw the queue rows that changed since the last tick, in one pass"""
+        with self.dirty_tasks_lock:
+            dirty, self.dirty_tasks = self.dirty_tasks, set()
+        
+        for task in dirty:
+            iid = str(task.task_id)
+            if self.queue_tree.exists(iid):
+                self.queue_tree.item(iid, values=self.queue_row_values(task))
+        
+        if dirty and self.active_tasks:
+            progress = sum(t.progress for t in self.active_tasks.values()) / len(self.active_tasks)
+            speed = sum(t.speed for t in self.active_tasks.values())
+            self.progress_bar['value'] = progress
+            self.progress_label.config(
+                text=f"Downloading {len(self.active_tasks)} of {len(self.active_tasks) + len(self.download_queue)} "
+                     f"jobs at {self.format_size(speed)}/s")
+        
+        self.root.after(self.queue_refresh_ms, self.refresh_queue_view)
+    
+    def queue_row_values(self, task):
+        title = task.title or task.url
+        if task.cancelled:
+            state = "Cancelling"
+        elif task.paused:
+            state = "Paused"
+        else:
+            state = task.status.value
+        if task.status is Status.QUEUED or task.status is Status.WAITING:
+            return (title, state, "", "", "")
+        stopping = task.paused or task.cancelled
+        rate = f"{self.format_size(task.speed)}/s" if task.speed and not stopping else ""
+        eta = str(datetime.timedelta(seconds=int(task.eta))) if task.eta is not None and not stopping else ""
+        return (title, state, f"{task.progress:.0f}%", rate, eta)
+    
+    def format_size(self, size):
+        for unit in ("B", "KB", "MB", "GB"):
+            if size < 1024 or unit == "GB":
+                return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+            size /= 1024
+    
+    def selected_tasks(self):
+        """Selected queue rows as tasks, in display order"""
+        tasks = {str(t.task_id): t for t in itertools.chain(self.active_tasks.values(), self.download_queue)}
+        return [tasks[iid] for iid in self.queue_tree.selection() if iid in tasks]
+    
+    def move_selected_tasks(self, step):
+        """Move the selected queued jobs up (-1) or down (1) in the queue"""
+        selected = [t for t in self.selected_tasks() if t in self.download_queue]
+        if step > 0:
+            selected.reverse()
+        
+        for task in selected:
+            index = self.download_queue.index(task)
+            new_index = index + step
+            if not 0 <= new_index < len(self.download_queue) or self.download_queue[new_index] in selected:
+                continue
+            self.download_queue[index], self.download_queue[new_index] = self.download_queue[new_index], task
+            self.queue_tree.move(str(task.task_id), '', len(self.active_tasks) + new_index)
+        
+        # A different job may now be first in line
+        self.process_download_queue()
+    
+    def toggle_pause_selected_tasks(self):
+        """Pause the selected jobs, or resume them if they are all paused"""
+        selected = self.selected_tasks()
+        resume = all(task.paused for task in selected)
+        
+        # Running jobs stop at their next progress update and go back to the queue
+        for task in selected:
+            task.paused = not resume
+            self.mark_task_dirty(task)
+        
+        if resume:
+            self.process_download_queue()
+    
+    def cancel_selected_tasks(self):
+        for task in self.selected_tasks():
+            self.cancel_task(task)
+    
+    def cancel_task(self, task):
+        task.cancelled = True
+        if task in self.download_queue:
+            # Queued jobs have no worker yet, so drop them right away
+            self.download_queue.remove(task)
+            self.queue_tree.delete(str(task.task_id))
+        else:
+            # The worker stops at its next progress update
+            self.mark_task_dirty(task)
     
     def update_progress(self, progress, status_text):
         self.progress_bar['value'] = progress
         self.progress_label.config(text=status_text)
     
     def cancel_download(self):
-        if self.download_thread and self.download_thread.is_alive():
-            self.stop_download = True
+        if self.active_tasks:
+            for task in list(self.active_tasks.values()):
+                self.cancel_task(task)
             self.progress_label.config(text="Cancelling download...")
         else:
             # Clear the queue if no active download
-            self.download_queue = []
+            for task in list(self.download_queue):
+                self.cancel_task(task)
             self.progress_label.config(text="Ready to download")
     
+    def load_fallocate(self):
+        """Look up fallocate() so partial downloads can be preallocated on Linux"""
+        if platform.system() != "Linux":
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fallocate = libc.fallocate64
+        except (OSError, AttributeError):
+            return None
+        fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        fallocate.restype = ctypes.c_int
+        return fallocate
+    
+    def estimate_download_size(self, info):
+        """Estimate the bytes a job needs on disk from the selected formats"""
+        if info.get('entries') is not None:
+            return sum(self.estimate_download_size(entry) for entry in info['entries'] if entry)
+        
+        formats = info.get('requested_formats') or [info]
+        size = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in formats)
+        
+        # Merging keeps the separate streams on disk until the merged file is written
+        if len(formats) > 1:
+            size *= 2
+        return size
+    
+    def available_disk_space(self, folder):
+        """Free space on the folder's filesystem not yet promised to running jobs"""
+        device = os.stat(folder).st_dev
+        with self.disk_reservation_lock:
+            reserved = sum(size for dev, size, _ in self.disk_reservations.values() if dev == device)
+        return shutil.disk_usage(folder).free - reserved - self.min_free_space
+    
+    def has_disk_space(self, folder, size):
+        try:
+            if not size:
+                # Unknown sizes can only be checked against the free space margin
+                return shutil.disk_usage(folder).free >= self.min_free_space
+            return self.available_disk_space(folder) >= size
+        except OSError:
+            # Let the download itself report an unusable folder
+            return True
+    
+    def reserve_disk_space(self, folder, size):
+        """Reserve space for a job, returning a reservation id or None if it does not fit"""
+        with self.disk_reservation_lock:
+            if not self.has_disk_space(folder, size):
+                return None
+            try:
+                device = os.stat(folder).st_dev
+            except OSError:
+                device = None
+            self.next_reservation_id += 1
+            # device, bytes still to be written, bytes already on disk per partial file
+            self.disk_reservations[self.next_reservation_id] = [device, size, {}]
+            return self.next_reservation_id
+    
+    def consume_disk_reservation(self, reservation, filename, allocated):
+        """Shrink a reservation as the first `allocated` bytes of a file reach the disk.
+        
+        Those bytes already count against the filesystem's free space.
+        """
+        with self.disk_reservation_lock:
+            entry = self.disk_reservations.get(reservation)
+            if entry is None or not filename:
+                return
+            accounted = entry[2].get(filename, 0)
+            if allocated > accounted:
+                entry[1] = max(entry[1] - (allocated - accounted), 0)
+            entry[2][filename] = max(allocated, accounted)
+    
+    def release_disk_space(self, reservation, truncate=False):
+        """Drop a reservation and forget its partial files.
+        
+        With truncate, partial files of a failed or cancelled job give back the
+        blocks preallocated past their end.
+        """
+        with self.disk_reservation_lock:
+            entry = self.disk_reservations.pop(reservation, None)
+        if entry is None:
+            return
+        
+        for filename in entry[2]:
+            if filename not in self.preallocated_files:
+                continue
+            self.preallocated_files.discard(filename)
+            if truncate:
+                try:
+                    os.truncate(filename, os.path.getsize(filename))
+                except OSError:
+                    pass
+    
+    def disk_space_may_free_up(self, folder):
+        """Whether a reservation or running job on the folder's disk could still release space"""
+        try:
+            device = os.stat(folder).st_dev
+        except OSError:
+            return True
+        with self.disk_reservation_lock:
+            if any(dev == device for dev, _, _ in self.disk_reservations.values()):
+                return True
+        for task in self.active_tasks.values():
+            try:
+                if os.stat(task.download_folder).st_dev == device:
+                    return True
+            except OSError:
+                pass
+        return False
+    
+    def preallocate_download(self, d, reservation):
+        """Preallocate the partial file of a plain HTTP download once its size is known"""
+        tmpfilename = d.get('tmpfilename')
+        total_bytes = d.get('total_bytes')
+        
+        # Fragmented downloads only report an estimate of their total size
+        if (self.fallocate is None or not tmpfilename or not total_bytes
+                or 'fragment_index' in d or tmpfilename in self.preallocated_files):
+            return
+        self.preallocated_files.add(tmpfilename)
+        
+        try:
+            fd = os.open(tmpfilename, os.O_WRONLY)
+        except OSError:
+            return
+        try:
+            # FALLOC_FL_KEEP_SIZE leaves the file size alone so yt-dlp can still resume it
+            if self.fallocate(fd, 1, 0, total_bytes) == 0:
+                self.consume_disk_reservation(reservation, tmpfilename, total_bytes)
+        finally:
+            os.close(fd)
+    
     def add_to_history(self, item):
+        if not self.history_loaded:
+            # Merged in once the saved history has been indexed
+            self.pending_history.append(item)
+            return
+        
         # Add to the beginning of the list
         self.download_history.insert(0, item)
+        self.history_index.add(item)
         
         # Limit history size
         if len(self.download_history) > self.max_history_items:
-            self.download_history = self.download_history[:self.max_history_items]
+            self.history_index.remove_oldest(len(self.download_history) - self.max_history_items)
+            del self.download_history[self.max_history_items:]
             
         # Save history to file
-        self.save_history()
+        self.append_history(item)
     
     def update_history_display(self):
-        if self.history_visible:
-            self.create_history_card()
+        if self.history_visible and self.history_frame:
+            self.render_history_page()
+    
+    def history_path(self, filename="download_history.jsonl"):
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    
+    def append_history(self, item):
+        """Append one record to the history file instead of rewriting all of it"""
+        try:
+            with open(self.history_path(), 'a') as f:
+                f.write(json.dumps(item.to_dict()) + "\n")
+        except Exception:
+            # Silently fail if we can't save history
+            pass
     
-    def save_history(self):
+    def save_history(self, history=None):
+        """Rewrite the history file from a newest-first list, dropping trimmed records"""
+        if history is None:
+            history = self.download_history
         try:
-            history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "download_history.json")
-            with open(history_file, 'w') as f:
-                json.dump(self.download_history, f)
+            history_file = self.history_path()
+            with open(history_file + ".tmp", 'w') as f:
+                for item in reversed(history):
+                    f.write(json.dumps(item.to_dict()) + "\n")
+            os.replace(history_file + ".tmp", history_file)
         except Exception:
             # Silently fail if we can't save history
             pass
     
     def load_history(self):
+        """Parse and index the saved history; runs on a worker thread"""
+        records = []
+        compact = False
         try:
-            history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "download_history.json")
+            history_file = self.history_path()
+            legacy_file = self.history_path("download_history.json")
             if os.path.exists(history_file):
                 with open(history_file, 'r') as f:
-                    self.download_history = json.load(f)
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            records.append(HistoryRecord.from_dict(json.loads(line)))
+                        except (ValueError, AttributeError):
+                            # Drop a line cut short by a crash mid-append
+                            compact = True
+            elif os.path.exists(legacy_file):
+                # Older versions kept a single JSON list, newest first
+                with open(legacy_file, 'r') as f:
+                    records = [HistoryRecord.from_dict(item) for item in reversed(json.load(f))]
+                compact = True
         except Exception:
             # If we can't load history, start with empty history
-            self.download_history = []
+            records = []
+        
+        # Appends leave records trimmed in earlier sessions in the file
+        compact = compact or len(records) > self.max_history_items
+        history = records[::-1][:self.max_history_items]
+        
+        # Index oldest first so entry ids follow download order
+        index = HistoryIndex()
+        for item in reversed(history):
+            index.add(item)
+        
+        if compact:
+            self.save_history(history)
+        
+        self.root.after(0, lambda: self.finish_loading_history(history, index))
+    
+    def finish_loading_history(self, history, index):
+        """Swap in the history loaded by load_history on the Tk thread"""
+        self.download_history = history
+        self.history_index = index
+        self.history_loaded = True
+        
+        for item in self.pending_history:
+            self.add_to_history(item)
+        self.pending_history = []
+        
+        self.update_history_display()
     
     def clear_history(self):
+        if not self.history_loaded:
+            return
         if messagebox.askyesno("Clear History", "Are you sure you want to clear download history?"):
             self.download_history = []
+            self.history_index.clear()
             self.save_history()
             self.update_history_display()
 